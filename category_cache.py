@@ -0,0 +1,120 @@
+import os
+import re
+import sqlite3
+import time
+import unicodedata
+from contextlib import closing
+from typing import Dict, Iterable, List, Optional
+from config import Config
+
+# Fixed taxonomy every line item is classified into and cached under
+CATEGORIES = [
+    'food', 'beverages', 'alcohol', 'tobacco', 'fuel', 'cleaning', 'personal_care',
+    'pharmacy', 'office_supplies', 'electronics', 'clothing', 'household',
+    'services', 'transport', 'other'
+]
+
+# Translations and spellings of taxonomy categories; narrower categories are deliberately
+# absent so a rule such as "dairy products" is never widened to "food"
+CATEGORY_SYNONYMS = {
+    'food items': 'food', 'alimentos': 'food', 'alimento': 'food', 'comida': 'food',
+    'beverage': 'beverages', 'drinks': 'beverages', 'bebidas': 'beverages',
+    'alcoholic beverages': 'alcohol', 'bebidas alcoholicas': 'alcohol', 'tabaco': 'tobacco',
+    'combustible': 'fuel', 'combustibles': 'fuel', 'limpieza': 'cleaning',
+    'personal care': 'personal_care', 'cuidado personal': 'personal_care', 'farmacia': 'pharmacy',
+    'office supplies': 'office_supplies', 'articulos de oficina': 'office_supplies',
+    'electronica': 'electronics', 'ropa': 'clothing', 'hogar': 'household',
+    'servicios': 'services', 'transporte': 'transport',
+}
+
+# Bump when the taxonomy or classification prompt changes to retire old entries
+CACHE_VERSION = 1
+
+
+def canonical_category(value: str) -> str:
+    """Map a category spelling onto the taxonomy, passing unknown names through"""
+    key = CategoryCache.normalize_description(value).replace('_', ' ')
+    if key.replace(' ', '_') in CATEGORIES:
+        return key.replace(' ', '_')
+    return CATEGORY_SYNONYMS.get(key, key)
+
+
+class CategoryCache:
+    """Persistent normalized-description -> category store for line items"""
+
+    def __init__(self, path: Optional[str] = None, ttl_days: Optional[int] = None):
+        self.path = path or Config.CATEGORY_CACHE_PATH
+        self.ttl_seconds = (Config.CATEGORY_CACHE_TTL_DAYS if ttl_days is None else ttl_days) * 86400
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS categories ("
+                "description TEXT PRIMARY KEY, category TEXT NOT NULL, "
+                "version INTEGER NOT NULL, updated_at REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        # SQLite serializes writers across gunicorn workers sharing the file
+        return sqlite3.connect(self.path, timeout=10)
+
+    @staticmethod
+    def normalize_description(description: str) -> str:
+        """Normalize an item description so equivalent spellings share one key"""
+        text = unicodedata.normalize('NFKD', str(description or ''))
+        text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+        text = re.sub(r'[^\w\s.,/%-]', ' ', text.lower())
+        return re.sub(r'\s+', ' ', text).strip()
+
+    def lookup(self, descriptions: Iterable[str]) -> Dict[str, str]:
+        """Return fresh cached categories for the given normalized descriptions"""
+        descriptions = list(dict.fromkeys(descriptions))
+        if not descriptions:
+            return {}
+        cutoff = time.time() - self.ttl_seconds
+        found = {}
+        try:
+            with closing(self._connect()) as conn, conn:
+                for start in range(0, len(descriptions), 500):
+                    batch = descriptions[start:start + 500]
+                    rows = conn.execute(
+                        f"SELECT description, category FROM categories "
+                        f"WHERE version = ? AND updated_at >= ? "
+                        f"AND description IN ({','.join('?' * len(batch))})",
+                        [CACHE_VERSION, cutoff, *batch]
+                    )
+                    found.update(rows)
+        except Exception as e:
+            print(f"Error reading category cache: {e}")
+        return found
+
+    def store(self, categories: Dict[str, str]):
+        """Record newly classified descriptions"""
+        if not categories:
+            return
+        now = time.time()
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO categories (description, category, version, updated_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    [(description, category, CACHE_VERSION, now) for description, category in categories.items()]
+                )
+        except Exception as e:
+            print(f"Error saving category cache: {e}")
+
+    def invalidate(self, descriptions: Optional[List[str]] = None):
+        """Forget the given descriptions (normalized on the way in), or every stale or outdated entry"""
+        try:
+            with closing(self._connect()) as conn, conn:
+                if descriptions is None:
+                    conn.execute(
+                        "DELETE FROM categories WHERE version != ? OR updated_at < ?",
+                        (CACHE_VERSION, time.time() - self.ttl_seconds)
+                    )
+                else:
+                    conn.executemany(
+                        "DELETE FROM categories WHERE description = ?",
+                        [(self.normalize_description(d),) for d in descriptions]
+                    )
+        except Exception as e:
+            print(f"Error invalidating category cache: {e}")
@@ -12,11 +12,20 @@ class Config:
     UPLOAD_FOLDER = 'uploads'
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     ALLOWED_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg', 'xml'}
+    XML_BOILERPLATE_ELEMENTS = {'Signature', 'Otros', 'Normativa'}  # stripped before prompting
 
     # OpenAI configuration
     OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
     OPENAI_MODEL = os.getenv('OPENAI_MODEL', 'gpt-4-turbo-preview')
     OPENAI_VISION_MODEL = os.getenv('OPENAI_VISION_MODEL', 'gpt-4-vision-preview')
+    PROMPT_TOKEN_BUDGET = int(os.getenv('PROMPT_TOKEN_BUDGET', 6000))  # invoice text tokens per prompt
+
+    # Line-item category cache (normalized description -> category)
+    CATEGORY_CACHE_PATH = os.getenv('CATEGORY_CACHE_PATH', 'data/category_cache.db')
+    CATEGORY_CACHE_TTL_DAYS = int(os.getenv('CATEGORY_CACHE_TTL_DAYS', 90))
+
+    # Report rollups
+    REPORT_TOP_N = int(os.getenv('REPORT_TOP_N', 10))
 
     # Email configuration
     MAIL_SERVER = os.getenv('MAIL_SERVER', 'smtp.gmail.com')
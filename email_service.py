@@ -1,5 +1,5 @@
 from flask_mail import Mail, Message
-from typing import Dict
+from typing import Dict, List
 from datetime import datetime
 
 
@@ -65,9 +65,23 @@ class EmailService:
                 <p><strong>Approved Amount:</strong> {report_data['currency']} {float(report_data.get('total_approved_amount', 0)):,.2f}</p>
                 <p><strong>Excluded Amount:</strong> {report_data['currency']} {float(report_data.get('total_excluded_amount', 0)):,.2f}</p>
                 <p><strong>Maximum Limit:</strong> {report_data['currency']} {float(report_data.get('max_limit', 0)):,.2f}</p>
+                {"<p><em>Invoices in other currencies are excluded from these amounts; see Totals by Currency.</em></p>" if report_data.get('other_currencies_excluded') else ""}
+                {f"<p class='error'><strong>{report_data['unparsed_amounts']} amount(s) could not be read and were counted as 0.</strong></p>" if report_data.get('unparsed_amounts') else ""}
             </div>
         """
 
+        # Add rollups
+        html += self.format_rollup_table("Totals by Currency", report_data.get('totals_by_currency', []),
+                                         ['currency', 'invoices', 'valid_invoices', 'approved_amount', 'excluded_amount'])
+        html += self.format_rollup_table("Top Suppliers", report_data.get('by_supplier', []),
+                                         ['supplier', 'currency', 'invoices', 'approved_amount', 'excluded_amount'])
+        html += self.format_rollup_table("Top Categories", report_data.get('by_category', []),
+                                         ['category', 'currency', 'items', 'amount'])
+        html += self.format_rollup_table("By Month", report_data.get('by_month', []),
+                                         ['month', 'currency', 'invoices', 'approved_amount', 'excluded_amount'])
+        html += self.format_rollup_table("Most Frequent Violations", report_data.get('top_violations', []),
+                                         ['violation', 'count'])
+
         # Add violations if any
         if report_data['violations']:
             html += """
@@ -93,6 +107,7 @@ class EmailService:
                         <th>Currency</th>
                         <th>Date</th>
                         <th>Status</th>
+                        <th>Prompt Tokens</th>
                         <th>Issues</th>
                     </tr>
                 </thead>
@@ -103,6 +118,9 @@ class EmailService:
             status = "✓ Valid" if result.get('is_valid', False) else "✗ Invalid"
             status_class = "success" if result.get('is_valid', False) else "error"
             violations = ", ".join(result.get('violations', [])) or "None"
+            tokens = result.get('prompt_tokens')
+            tokens = (f"{tokens['before']} → {tokens['after']}{' (truncated)' if tokens.get('truncated') else ''}"
+                      if tokens else "N/A")
 
             html += f"""
                 <tr>
@@ -111,6 +129,7 @@ class EmailService:
                     <td>{result.get('currency', 'Unknown')}</td>
                     <td>{result.get('date', 'Unknown')}</td>
                     <td class="{status_class}">{status}</td>
+                    <td>{tokens}</td>
                     <td>{violations}</td>
                 </tr>
             """
@@ -128,6 +147,29 @@ class EmailService:
 
         return html
 
+    @staticmethod
+    def format_rollup_table(title: str, rows: List[Dict], columns: List[str]) -> str:
+        """Format one report rollup as an HTML table"""
+        if not rows:
+            return ""
+
+        header = "".join(f"<th>{column.replace('_', ' ').title()}</th>" for column in columns)
+        body = ""
+        for row in rows:
+            cells = ""
+            for column in columns:
+                value = row.get(column, '')
+                cells += f"<td>{value:,.2f}</td>" if isinstance(value, float) else f"<td>{value}</td>"
+            body += f"<tr>{cells}</tr>"
+
+        return f"""
+            <h3>{title}</h3>
+            <table>
+                <thead><tr>{header}</tr></thead>
+                <tbody>{body}</tbody>
+            </table>
+        """
+
     def send_report(self, recipient_email: str, report_data: Dict) -> bool:
         """Send email report to recipient"""
         try:
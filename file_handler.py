@@ -64,6 +64,19 @@ class FileHandler:
             print(f"Error parsing XML: {e}")
             return {}
 
+    @staticmethod
+    def strip_xml_boilerplate(data):
+        """Drop signature, legal-notice and namespace nodes that carry no invoice data"""
+        if isinstance(data, dict):
+            return {
+                key: FileHandler.strip_xml_boilerplate(value)
+                for key, value in data.items()
+                if key.split(':')[-1] not in Config.XML_BOILERPLATE_ELEMENTS and not key.startswith('@xmlns')
+            }
+        if isinstance(data, list):
+            return [FileHandler.strip_xml_boilerplate(value) for value in data]
+        return data
+
     @staticmethod
     def encode_image_to_base64(filepath: str) -> Optional[str]:
         """Encode image to base64 for OpenAI Vision API"""
@@ -97,7 +110,7 @@ class FileHandler:
         elif ext == 'xml':
             result['data'] = FileHandler.extract_text_from_xml(filepath)
             # Convert XML data to string for processing
-            result['text'] = str(result['data'])
+            result['text'] = str(FileHandler.strip_xml_boilerplate(result['data']))
         elif ext in ['png', 'jpg', 'jpeg']:
             result['base64'] = FileHandler.encode_image_to_base64(filepath)
 
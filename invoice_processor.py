@@ -1,6 +1,9 @@
 from typing import Dict, List
 from openai import OpenAI
 from config import Config
+from category_cache import CATEGORIES, CategoryCache, canonical_category
+from report_aggregator import InvoiceColumns, normalize_currency, top_per_currency
+from prompt_compactor import compact_invoice_text
 import json
 
 
@@ -9,12 +12,14 @@ class InvoiceProcessor:
 
     def __init__(self):
         self.client = OpenAI(api_key=Config.OPENAI_API_KEY)
+        self.category_cache = CategoryCache()
 
     def parse_limitations(self, limitations_text: str) -> Dict:
         """Parse user-defined limitations using OpenAI"""
         prompt = f"""
         Parse the following invoice validation rules and extract:
-        1. Allowed categories (e.g., food items only)
+        1. Allowed categories, in the rule's own wording; use a name from {CATEGORIES}
+           only when the rule means exactly that category (e.g. "food items" -> food, but keep "dairy products")
         2. Maximum amount limit
         3. Currency (CRC, USD, etc.)
         4. Any other restrictions
@@ -49,8 +54,13 @@ class InvoiceProcessor:
 
     def process_text_invoice(self, text: str, rules: Dict) -> Dict:
         """Process text-based invoice (PDF or XML) and validate against rules"""
-        prompt = f"""
-        Analyze the following invoice and extract:
+        content, token_stats = compact_invoice_text(text, Config.PROMPT_TOKEN_BUDGET)
+
+        # Static instructions first, then per-request rules and invoice content. The static
+        # prefix (~200 tokens) is below OpenAI's 1024-token caching minimum, so this keeps the
+        # layout cache-ready but does not by itself produce cache hits.
+        prompt = """
+        Analyze the invoice below and extract:
         1. Supplier/vendor name
         2. Invoice number
         3. Invoice date
@@ -58,26 +68,27 @@ class InvoiceProcessor:
         5. Total amount
         6. Currency
 
-        Then validate against these rules:
-        - Allowed categories: {rules.get('allowed_categories', [])}
-        - Maximum amount: {rules.get('max_amount', 0)} {rules.get('currency', 'CRC')}
-
-        Invoice content:
-        {text}
+        Then validate it against the maximum amount rule given below.
+        Do not judge item categories; they are checked separately.
+        Lines marked [...] were omitted to fit the context; do not treat them as missing data.
 
         Respond in JSON format with:
-        {{
+        {
             "supplier_name": string,
             "invoice_number": string,
-            "items": [list of items with name, amount, category],
+            "items": [list of items with name, amount],
             "total_amount": number,
             "currency": string,
             "date": string,
             "is_valid": boolean,
             "violations": [list of rule violations],
-            "non_compliant_items": [items that don't match allowed categories],
             "exceeds_limit": boolean
-        }}
+        }
+        """ + f"""
+        Maximum amount: {rules.get('max_amount', 0)} {rules.get('currency', 'CRC')}
+
+        Invoice content:
+        {content}
         """
 
         try:
@@ -92,6 +103,15 @@ class InvoiceProcessor:
             )
 
             result = json.loads(response.choices[0].message.content)
+            result['prompt_tokens'] = token_stats
+            result = self.apply_category_rules(result, rules)
+            # Items cut from the prompt were never checked, so the invoice cannot be approved
+            if token_stats['dropped_amount_lines']:
+                result['violations'].append(
+                    f"{token_stats['dropped_amount_lines']} line(s) with amounts were omitted to fit "
+                    f"the prompt and could not be validated; manual review required"
+                )
+                result['is_valid'] = False
             return result
 
         except Exception as e:
@@ -106,7 +126,8 @@ class InvoiceProcessor:
                 "is_valid": False,
                 "violations": [f"Processing error: {str(e)}"],
                 "non_compliant_items": [],
-                "exceeds_limit": False
+                "exceeds_limit": False,
+                "prompt_tokens": token_stats
             }
 
     def process_image_invoice(self, base64_image: str, file_extension: str, rules: Dict) -> Dict:
@@ -120,21 +141,20 @@ class InvoiceProcessor:
         5. Total amount
         6. Currency
 
-        Then validate against these rules:
-        - Allowed categories: {rules.get('allowed_categories', [])}
+        Then validate against this rule:
         - Maximum amount: {rules.get('max_amount', 0)} {rules.get('currency', 'CRC')}
+        Do not judge item categories; they are checked separately.
 
         Respond in JSON format with:
         {{
             "supplier_name": string,
             "invoice_number": string,
-            "items": [list of items with name, amount, category],
+            "items": [list of items with name, amount],
             "total_amount": number,
             "currency": string,
             "date": string,
             "is_valid": boolean,
             "violations": [list of rule violations],
-            "non_compliant_items": [items that don't match allowed categories],
             "exceeds_limit": boolean
         }}
         """
@@ -176,7 +196,7 @@ class InvoiceProcessor:
                 else:
                     raise ValueError("Could not parse JSON from response")
 
-            return result
+            return self.apply_category_rules(result, rules)
 
         except Exception as e:
             print(f"Error processing image invoice: {e}")
@@ -193,6 +213,130 @@ class InvoiceProcessor:
                 "exceeds_limit": False
             }
 
+    def classify_items(self, descriptions: List[str]) -> Dict[str, str]:
+        """Classify unseen item descriptions in a single batched OpenAI call"""
+        if not descriptions:
+            return {}
+
+        prompt = f"""
+        Classify each item description into exactly one of these categories: {CATEGORIES}
+        Use "other" when an item fits none of them.
+
+        Items: {json.dumps(descriptions, ensure_ascii=False)}
+
+        Respond in JSON format with key "categories" mapping each item exactly as given to its category.
+        """
+
+        try:
+            response = self.client.chat.completions.create(
+                model=Config.OPENAI_MODEL,
+                messages=[
+                    {"role": "system", "content": "You classify invoice line items. Always respond with valid JSON."},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0,
+                response_format={"type": "json_object"}
+            )
+
+            categories = json.loads(response.choices[0].message.content).get('categories', {})
+            classified = {}
+            for description in descriptions:
+                category = canonical_category(categories.get(description, ''))
+                if category:
+                    classified[description] = category if category in CATEGORIES else 'other'
+            return classified
+
+        except Exception as e:
+            print(f"Error classifying items: {e}")
+            return {}
+
+    def match_rule_categories(self, descriptions: List[str], rule_categories: List[str]) -> Dict[str, str]:
+        """Judge items against rule categories that have no exact taxonomy match"""
+        if not descriptions:
+            return {}
+
+        prompt = f"""
+        For each item description, decide which of these allowed categories it strictly belongs to: {rule_categories}
+        Use null when it belongs to none of them. Do not broaden a category (e.g. "dairy products" does not include rice).
+
+        Items: {json.dumps(descriptions, ensure_ascii=False)}
+
+        Respond in JSON format with key "matches" mapping each item exactly as given to its category or null.
+        """
+
+        try:
+            response = self.client.chat.completions.create(
+                model=Config.OPENAI_MODEL,
+                messages=[
+                    {"role": "system", "content": "You check invoice line items against validation rules. Always respond with valid JSON."},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0,
+                response_format={"type": "json_object"}
+            )
+
+            matches = json.loads(response.choices[0].message.content).get('matches') or {}
+            return {description: matches.get(description) or '' for description in descriptions if description in matches}
+
+        except Exception as e:
+            print(f"Error matching rule categories: {e}")
+            return {}
+
+    def apply_category_rules(self, result: Dict, rules: Dict) -> Dict:
+        """Resolve item categories via the cache and flag non-compliant items"""
+        allowed_categories = rules.get('allowed_categories') or []
+        items = [item for item in result.get('items') or [] if isinstance(item, dict)]
+        result['items'] = items
+        result['violations'] = list(result.get('violations') or [])
+        result['non_compliant_items'] = []
+        if not allowed_categories or not items:
+            return result
+
+        keys = [CategoryCache.normalize_description(item.get('name', '')) for item in items]
+        known = self.category_cache.lookup(key for key in keys if key)
+        unseen = sorted({key for key in keys if key and key not in known})
+        classified = self.classify_items(unseen)
+        self.category_cache.store(classified)
+        known.update(classified)
+
+        # Rule categories outside the taxonomy are judged by the model against the rule's own
+        # wording, so a narrow rule ("dairy products") is never widened to a broad category
+        allowed = {canonical_category(c) for c in allowed_categories} & set(CATEGORIES)
+        rule_categories = [c for c in allowed_categories if canonical_category(c) not in CATEGORIES]
+        pending = sorted({key for key in keys if key and known.get(key) not in allowed})
+        matched = self.match_rule_categories(pending, rule_categories) if rule_categories else {}
+
+        unclassified = False
+        for item, key in zip(items, keys):
+            if not key:
+                continue
+            category = known.get(key)
+            if category in allowed:
+                item['category'] = category
+                continue
+            if rule_categories:
+                if key not in matched:
+                    unclassified = True
+                    continue
+                if matched[key]:
+                    item['category'] = matched[key]
+                    continue
+            elif category is None:
+                unclassified = True
+                continue
+            item['category'] = category or 'other'
+            result['non_compliant_items'].append(item)
+            result['violations'].append(
+                f"Item not in allowed categories: {item.get('name', 'N/A')} ({item['category']})"
+            )
+
+        if unclassified:
+            result['violations'].append("Some items could not be classified")
+        if result['non_compliant_items'] or unclassified:
+            result['is_valid'] = False
+
+        return result
+
     def calculate_accuracy(self, results: List[Dict]) -> float:
         """Calculate processing accuracy percentage"""
         if not results:
@@ -202,27 +346,40 @@ class InvoiceProcessor:
         return (valid_count / len(results)) * 100
 
     def generate_report_data(self, results: List[Dict], rules: Dict) -> Dict:
-        """Generate comprehensive report data"""
-        total_processed = len(results)
-        valid_invoices = sum(1 for r in results if r.get('is_valid', False))
+        """Generate comprehensive report data for the current batch"""
+        columns = InvoiceColumns.from_results(results)
+        currency = normalize_currency(rules.get('currency', 'CRC'))
+        total_processed = len(columns)
+        valid_invoices = sum(columns.valid)
         accuracy = self.calculate_accuracy(results)
-
-        total_amount = sum(r.get('total_amount', 0) for r in results if r.get('is_valid', False))
-        excluded_amount = sum(r.get('total_amount', 0) for r in results if not r.get('is_valid', False))
+        approved_amount, excluded_amount = columns.totals(currency)
+        totals_by_currency = columns.currency_rollup()
 
         all_violations = []
         for r in results:
             all_violations.extend(r.get('violations', []))
 
+        top_n = Config.REPORT_TOP_N
         return {
             'total_processed': total_processed,
             'valid_invoices': valid_invoices,
             'invalid_invoices': total_processed - valid_invoices,
             'accuracy_percentage': round(accuracy, 2),
-            'total_approved_amount': total_amount,
+            'total_approved_amount': approved_amount,
             'total_excluded_amount': excluded_amount,
-            'currency': rules.get('currency', 'CRC'),
+            'currency': currency,
+            'other_currencies_excluded': any(
+                row['currency'] != currency and (row['approved_amount'] or row['excluded_amount'])
+                for row in totals_by_currency
+            ),
+            'unparsed_amounts': columns.unparsed_amounts,
             'max_limit': rules.get('max_amount', 0),
+            'totals_by_currency': totals_by_currency,
+            'by_supplier': top_per_currency(columns.rollup('supplier'),
+                                            lambda row: row['approved_amount'] + row['excluded_amount'], top_n),
+            'by_category': top_per_currency(columns.category_rollup(), lambda row: row['amount'], top_n),
+            'by_month': sorted(columns.rollup('month'), key=lambda row: (row['month'], row['currency'])),
+            'top_violations': columns.top_violations(top_n),
             'violations': all_violations,
             'detailed_results': results
         }
@@ -0,0 +1,166 @@
+import re
+from typing import Dict, List, Tuple
+
+# Lines that never carry invoice data: page markers, legal notices, courtesy text
+BOILERPLATE_PATTERNS = [
+    re.compile(p, re.IGNORECASE) for p in [
+        r'^(p[aá]gina|page|p[aá]g\.?)\s*\d+(\s*(de|of|/)\s*\d+)?$',
+        r'^\d+\s*(/|de|of)\s*\d+$',
+        r'autorizad[ao] mediante (la )?resoluci[oó]n',
+        r'emitid[ao] conforme (a )?lo establecido',
+        r'resoluci[oó]n (de facturaci[oó]n electr[oó]nica|dgt|n[°ºo.])',
+        r'(este|el presente) documento (es|fue) generado',
+        r'(documento|factura) generad[ao] (por|con|mediante)',
+        r'gracias por su (compra|preferencia|visita)',
+        r'^(www\.|https?://)\S+$',
+        r'todos los derechos reservados|all rights reserved',
+        r'^(original|copia)( cliente| emisor)?$',
+    ]
+]
+
+# Lines worth keeping under truncation: money amounts and totals
+AMOUNT_PATTERN = re.compile(
+    r'[₡¢$€]\s*\d[\d.,]*'                            # symbol-prefixed: ₡2,000 / $ 15
+    r'|\b\d{1,3}(?:[.,]\d{3})+(?:[.,]\d{1,2})?\b'      # thousands-separated: 1,500 / 1.500,00
+    r'|\b\d+[.,]\d{2}\b'                              # decimals: 1500.00
+    r'|(?<![\w.,/:-])\d+\s*$'                          # bare trailing integer: Total 1500
+)
+TOTAL_PATTERN = re.compile(
+    r'\b(sub-?total|total\w*|iva|impuesto\w*|descuento|importe|saldo|moneda|currency|tax)\b',
+    re.IGNORECASE
+)
+TOKEN_PATTERN = re.compile(r'\w+|[^\w\s]')
+
+TRUNCATION_MARKER = '[...]'
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate the model token count of a piece of text"""
+    # Long digit runs (Hacienda claves) and base64 tokenize at roughly 4 characters per token
+    text = text or ''
+    return max(len(TOKEN_PATTERN.findall(text)), (len(text) + 3) // 4)
+
+
+def normalize_lines(text: str) -> List[str]:
+    """Collapse whitespace, drop empty/boilerplate lines and repeated headers"""
+    lines = []
+    seen = set()
+    for raw in (text or '').splitlines():
+        line = re.sub(r'\s+', ' ', raw).strip()
+        if not line or any(p.search(line) for p in BOILERPLATE_PATTERNS):
+            continue
+        # Repeated lines without amounts are page headers/footers; item rows may legitimately repeat
+        key = line.lower()
+        if key in seen and not AMOUNT_PATTERN.search(line):
+            continue
+        seen.add(key)
+        lines.append(line)
+    return lines
+
+
+def _split_by_tokens(text: str, max_tokens: int) -> List[str]:
+    """Cut text into pieces of at most max_tokens estimated tokens, whatever its separators"""
+    width = max_tokens * 4
+    pieces = []
+    for match in re.finditer(r'\s*(?:\w+|[^\w\s])', text):
+        part = match.group(0)
+        pieces.extend(part[i:i + width] for i in range(0, len(part), width))
+
+    chunks = []
+    current = ''
+    for piece in pieces:
+        if current and estimate_tokens(current + piece) > max_tokens:
+            chunks.append(current.strip())
+            current = piece.lstrip()
+        else:
+            current += piece
+    if current.strip():
+        chunks.append(current.strip())
+    return chunks
+
+
+def _split_long_line(line: str, max_tokens: int) -> List[str]:
+    """Break an over-long line (e.g. flattened XML) at separators into budget-sized chunks"""
+    chunks = []
+    current = ''
+    for part in re.split(r'(?<=[,;])\s+', line):
+        candidate = f"{current} {part}".strip()
+        if current and estimate_tokens(candidate) > max_tokens:
+            chunks.append(current)
+            current = part
+        else:
+            current = candidate
+    if current:
+        chunks.append(current)
+    # Parts with no separator to split on are cut by token count
+    return [piece for chunk in chunks for piece in
+            (_split_by_tokens(chunk, max_tokens) if estimate_tokens(chunk) > max_tokens else [chunk])]
+
+
+def _truncate(lines: List[str], budget: int) -> Tuple[List[str], int]:
+    """Keep the header, totals and line items that fit in the token budget
+
+    Returns the kept lines and how many lines with amounts had to be dropped.
+    """
+    costs = [estimate_tokens(line) for line in lines]
+    keep = [False] * len(lines)
+    remaining = budget
+
+    def take(index: int) -> bool:
+        nonlocal remaining
+        if keep[index] or costs[index] > remaining:
+            return False
+        keep[index] = True
+        remaining -= costs[index]
+        return True
+
+    # Header (supplier, invoice number, date) gets up to a fifth of the budget
+    head_budget = budget // 5
+    for i in range(len(lines)):
+        if budget - remaining + costs[i] > head_budget:
+            break
+        take(i)
+
+    # Totals come last on an invoice, so scan them from the end
+    for i in reversed(range(len(lines))):
+        if TOTAL_PATTERN.search(lines[i]) and AMOUNT_PATTERN.search(lines[i]):
+            take(i)
+
+    for i in range(len(lines)):
+        if AMOUNT_PATTERN.search(lines[i]):
+            take(i)
+
+    for i in range(len(lines)):
+        take(i)
+
+    kept = []
+    dropped_amount_lines = 0
+    for line, selected in zip(lines, keep):
+        if selected:
+            kept.append(line)
+            continue
+        if AMOUNT_PATTERN.search(line):
+            dropped_amount_lines += 1
+        if not kept or kept[-1] != TRUNCATION_MARKER:
+            kept.append(TRUNCATION_MARKER)
+    return kept, dropped_amount_lines
+
+
+def compact_invoice_text(text: str, token_budget: int) -> Tuple[str, Dict]:
+    """Normalize, strip boilerplate and fit invoice text into a token budget"""
+    tokens_before = estimate_tokens(text)
+    lines = normalize_lines(text)
+    truncated = sum(estimate_tokens(line) for line in lines) > token_budget
+    dropped_amount_lines = 0
+    if truncated:
+        max_line_tokens = max(token_budget // 20, 1)
+        lines = [chunk for line in lines for chunk in _split_long_line(line, max_line_tokens)]
+        lines, dropped_amount_lines = _truncate(lines, token_budget)
+
+    compacted = '\n'.join(lines)
+    return compacted, {
+        'before': tokens_before,
+        'after': estimate_tokens(compacted),
+        'truncated': truncated,
+        'dropped_amount_lines': dropped_amount_lines,
+    }
@@ -0,0 +1,261 @@
+import re
+from array import array
+from heapq import nlargest
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; fall back to per-row loops
+    np = None
+
+# Symbols and names the model returns for a currency, mapped to ISO codes
+CURRENCY_ALIASES = {
+    '₡': 'CRC', '¢': 'CRC', 'COLON': 'CRC', 'COLONES': 'CRC', 'CRC': 'CRC',
+    '$': 'USD', 'US$': 'USD', 'USD': 'USD', 'DOLAR': 'USD', 'DOLARES': 'USD',
+    'DOLLAR': 'USD', 'DOLLARS': 'USD', 'US DOLLARS': 'USD',
+    '€': 'EUR', 'EUR': 'EUR', 'EURO': 'EUR', 'EUROS': 'EUR',
+}
+
+
+def normalize_currency(value) -> str:
+    """Map a currency symbol or name onto its ISO code"""
+    text = str(value or '').strip().upper()
+    for accented, plain in (('Ó', 'O'), ('Á', 'A')):
+        text = text.replace(accented, plain)
+    return CURRENCY_ALIASES.get(text, text or 'UNKNOWN')
+
+
+def parse_amount(value) -> Optional[float]:
+    """Parse an extracted amount, returning None when it is not a number"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = re.sub(r'[^\d,.\-]', '', str(value or ''))
+    if not re.search(r'\d', text):
+        return None
+
+    if ',' in text and '.' in text:
+        # Whichever separator comes last is the decimal mark: 1.500,00 / 1,500.00
+        decimal = ',' if text.rfind(',') > text.rfind('.') else '.'
+        text = text.replace('.' if decimal == ',' else ',', '').replace(decimal, '.')
+    else:
+        for separator in (',', '.'):
+            if separator in text:
+                tail = text.rsplit(separator, 1)[1]
+                # Repeated separators or a three-digit group are thousands: 1,500 / 1.500.000
+                if text.count(separator) > 1 or len(tail) == 3:
+                    text = text.replace(separator, '')
+                else:
+                    text = text.replace(separator, '.')
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+def _month_bucket(date_value) -> str:
+    """Reduce an invoice date string to a YYYY-MM bucket"""
+    text = str(date_value or '')
+    match = re.search(r'(\d{4})[-/.](\d{1,2})', text)
+    if match:
+        year, month = match.groups()
+    else:
+        match = re.search(r'\d{1,2}[-/.](\d{1,2})[-/.](\d{4})', text)
+        if not match:
+            return 'Unknown'
+        month, year = match.groups()
+    if not 1 <= int(month) <= 12:
+        return 'Unknown'
+    return f"{year}-{int(month):02d}"
+
+
+def top_per_currency(rows: List[Dict], score: Callable[[Dict], float], limit: int) -> List[Dict]:
+    """Keep the top rows within each currency, so amounts are never ranked across currencies"""
+    by_currency: Dict[str, List[Dict]] = {}
+    for row in rows:
+        by_currency.setdefault(row['currency'], []).append(row)
+    return [row for currency in sorted(by_currency)
+            for row in nlargest(limit, by_currency[currency], key=score)]
+
+
+class _Dictionary:
+    """Dictionary encoding of a string column into dense integer codes"""
+
+    def __init__(self):
+        self.values: List[str] = []
+        self._codes: Dict[str, int] = {}
+
+    def encode(self, value: str) -> int:
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def lookup(self, value: str) -> int:
+        return self._codes.get(value, -1)
+
+
+class InvoiceColumns:
+    """Compact column store of one batch of invoice results for report rollups"""
+
+    def __init__(self):
+        # Invoice-level columns
+        self.amounts = array('d')
+        self.valid = array('b')
+        self.currency = array('I')
+        self.supplier = array('I')
+        self.month = array('I')
+        # Item-level columns
+        self.item_amounts = array('d')
+        self.item_currency = array('I')
+        self.item_category = array('I')
+        # Violation occurrence counts, indexed by violation code
+        self.violation_counts = array('I')
+        # Amounts that could not be parsed (stored as 0 in the amount columns)
+        self.unparsed_amounts = 0
+
+        self.currencies = _Dictionary()
+        self.suppliers = _Dictionary()
+        self.months = _Dictionary()
+        self.categories = _Dictionary()
+        self.violations = _Dictionary()
+
+    @classmethod
+    def from_results(cls, results: Iterable[Dict]) -> 'InvoiceColumns':
+        """Build a column store from processed invoice results"""
+        columns = cls()
+        for result in results:
+            columns.append(result)
+        return columns
+
+    def __len__(self) -> int:
+        return len(self.amounts)
+
+    def _amount(self, value) -> float:
+        amount = parse_amount(value)
+        if amount is None:
+            self.unparsed_amounts += 1
+            return 0.0
+        return amount
+
+    def append(self, result: Dict):
+        """Append one processed invoice result"""
+        currency = self.currencies.encode(normalize_currency(result.get('currency')))
+        self.amounts.append(self._amount(result.get('total_amount', 0)))
+        self.valid.append(1 if result.get('is_valid', False) else 0)
+        self.currency.append(currency)
+        self.supplier.append(self.suppliers.encode(str(result.get('supplier_name') or 'Desconocido').strip()))
+        self.month.append(self.months.encode(_month_bucket(result.get('date'))))
+
+        for item in result.get('items') or []:
+            if not isinstance(item, dict):
+                continue
+            self.item_amounts.append(self._amount(item.get('amount', 0)))
+            self.item_currency.append(currency)
+            self.item_category.append(self.categories.encode(str(item.get('category') or 'uncategorized')))
+
+        for violation in result.get('violations') or []:
+            code = self.violations.encode(str(violation))
+            if code == len(self.violation_counts):
+                self.violation_counts.append(0)
+            self.violation_counts[code] += 1
+
+    @staticmethod
+    def _cells(keys: array, width: int, currency: Optional[array], amounts: array, valid: Optional[array],
+               size: int) -> Tuple[List[int], List[int], List[float], List[float]]:
+        """Aggregate counts, valid counts, approved and excluded sums per (key, currency) cell"""
+        cells = size * width
+        if np is not None:
+            cell = np.frombuffer(keys, dtype=f'u{keys.itemsize}').astype(np.int64)
+            if currency is not None:
+                cell = cell * width + np.frombuffer(currency, dtype=f'u{currency.itemsize}')
+            values = np.frombuffer(amounts, dtype=np.float64)
+            flags = np.frombuffer(valid, dtype=np.int8).astype(bool) if valid is not None else np.ones(len(values), bool)
+            counts = np.bincount(cell, minlength=cells)
+            valid_counts = np.bincount(cell, weights=flags, minlength=cells).astype(np.int64)
+            approved = np.bincount(cell, weights=np.where(flags, values, 0.0), minlength=cells)
+            excluded = np.bincount(cell, weights=np.where(flags, 0.0, values), minlength=cells)
+            return counts.tolist(), valid_counts.tolist(), approved.tolist(), excluded.tolist()
+
+        counts = [0] * cells
+        valid_counts = [0] * cells
+        approved = [0.0] * cells
+        excluded = [0.0] * cells
+        currency = currency if currency is not None else array('I', [0]) * len(keys)
+        flags = valid if valid is not None else array('b', b'\x01' * len(keys))
+        for key, cur, amount, flag in zip(keys, currency, amounts, flags):
+            cell = key * width + cur
+            counts[cell] += 1
+            if flag:
+                valid_counts[cell] += 1
+                approved[cell] += amount
+            else:
+                excluded[cell] += amount
+        return counts, valid_counts, approved, excluded
+
+    def totals(self, currency: str) -> Tuple[float, float]:
+        """Approved and excluded invoice totals in one currency"""
+        code = self.currencies.lookup(normalize_currency(currency))
+        if code < 0:
+            return 0.0, 0.0
+        _, _, approved, excluded = self._cells(self.currency, 1, None, self.amounts, self.valid,
+                                            len(self.currencies.values))
+        return approved[code], excluded[code]
+
+    def rollup(self, dimension: str) -> List[Dict]:
+        """Roll invoices up by supplier or month, split by currency"""
+        keys, labels = {
+            'supplier': (self.supplier, self.suppliers.values),
+            'month': (self.month, self.months.values),
+        }[dimension]
+        width = len(self.currencies.values)
+        counts, _, approved, excluded = self._cells(keys, width, self.currency, self.amounts, self.valid, len(labels))
+        rows = []
+        for cell, count in enumerate(counts):
+            if count:
+                key, cur = divmod(cell, width)
+                rows.append({
+                    dimension: labels[key],
+                    'currency': self.currencies.values[cur],
+                    'invoices': count,
+                    'approved_amount': round(approved[cell], 2),
+                    'excluded_amount': round(excluded[cell], 2),
+                })
+        return rows
+
+    def currency_rollup(self) -> List[Dict]:
+        """Roll invoices up by currency"""
+        width = len(self.currencies.values)
+        counts, valid_counts, approved, excluded = self._cells(self.currency, 1, None, self.amounts, self.valid, width)
+        return [{
+            'currency': self.currencies.values[cur],
+            'invoices': counts[cur],
+            'valid_invoices': valid_counts[cur],
+            'approved_amount': round(approved[cur], 2),
+            'excluded_amount': round(excluded[cur], 2),
+        } for cur in range(width) if counts[cur]]
+
+    def category_rollup(self) -> List[Dict]:
+        """Roll line items up by category, split by currency"""
+        width = len(self.currencies.values)
+        counts, _, amounts, _ = self._cells(self.item_category, width, self.item_currency, self.item_amounts, None,
+                                         len(self.categories.values))
+        rows = []
+        for cell, count in enumerate(counts):
+            if count:
+                key, cur = divmod(cell, width)
+                rows.append({
+                    'category': self.categories.values[key],
+                    'currency': self.currencies.values[cur],
+                    'items': count,
+                    'amount': round(amounts[cell], 2),
+                })
+        return rows
+
+    def top_violations(self, limit: int) -> List[Dict]:
+        """Return the most frequent violations"""
+        ranked = nlargest(limit, range(len(self.violation_counts)), key=self.violation_counts.__getitem__)
+        return [{'violation': self.violations.values[code], 'count': self.violation_counts[code]}
+                for code in ranked]